@@ -59,13 +59,34 @@ def get_answers_from_json(data):
     
     return predicted, ground_truth
 
+def load_jsonl_records(jsonl_path):
+    """Load the records of a JSONL response file, named by query ID."""
+    records = {}
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number}: {e}")
+                continue
+            # Later records for the same query replace earlier ones
+            records[str(data.get("q_id", f"line {line_number}"))] = data
+    return records
+
 def evaluate_directory(directory_path):
-    """Evaluate all JSON files in a directory."""
+    """Evaluate all JSON files in a directory, or all records in a JSONL file."""
     if not os.path.exists(directory_path):
         print(f"Directory not found: {directory_path}")
         return
     
-    json_files = [f for f in os.listdir(directory_path) if f.endswith('.json')]
+    if os.path.isfile(directory_path) and directory_path.endswith('.jsonl'):
+        records = load_jsonl_records(directory_path)
+        json_files = list(records)
+    else:
+        records = None
+        json_files = [f for f in os.listdir(directory_path) if f.endswith('.json')]
     
     if not json_files:
         print(f"No JSON files found in {directory_path}")
@@ -80,8 +101,11 @@ def evaluate_directory(directory_path):
         filepath = os.path.join(directory_path, filename)
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if records is not None:
+                data = records[filename]
+            else:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
             
             predicted, ground_truth = get_answers_from_json(data)
             
@@ -110,7 +134,7 @@ def evaluate_directory(directory_path):
 
 def main():
     parser = argparse.ArgumentParser(description="Word F1 evaluation for response files")
-    parser.add_argument("directory", help="Directory containing JSON response files")
+    parser.add_argument("directory", help="Directory containing JSON response files, or a JSONL response file")
     
     args = parser.parse_args()
     evaluate_directory(args.directory)
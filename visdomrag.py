@@ -3,15 +3,16 @@ import json
 import torch
 import pandas as pd
 import numpy as np
-import time
 import logging
+import asyncio
 import argparse
 import re
-import uuid
-import csv
+import ast
+import hashlib
+from collections import OrderedDict
 from tqdm import tqdm
 from io import BytesIO
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import base64
 import requests
 from PIL import Image
@@ -20,6 +21,11 @@ from difflib import SequenceMatcher
 import PyPDF2
 import pytesseract
 import traceback
+import tempfile
+import threading
+import mmap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
 
 # Optional imports based on selected models
 try:
@@ -36,6 +42,44 @@ try:
 except ImportError:
     pass
 
+# Optional persistent cache for LLM responses and text embeddings
+try:
+    import diskcache
+except ImportError:
+    pass
+
+# Optional fast JSON serialiser for response files
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional in-process PDF renderer; pdf2image (poppler) is used when it is missing
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# Optional token-bucket rate limiter for LLM API calls
+try:
+    from aiolimiter import AsyncLimiter
+except ImportError:
+    pass
+
+# Optional SIMD base64 encoder for images sent to the LLM APIs
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
+# Optional fast CSV reader for retrieval results
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pacsv = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -52,6 +96,463 @@ qa_prompts = {
     "spiqa": "You are a scientific paper author. Answer the question in 1-3 authoritative sentences."
 }
 
+def _init_extraction_worker():
+    """Limit Tesseract to a single thread in each worker process to avoid oversubscription."""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def extract_text_from_pdf(pdf_path, cache_dir=None):
+    """
+    Extract text from a PDF file using OCR if needed.
+    
+    Defined at module level so it can be dispatched to a process pool.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        cache_dir (str): Optional directory to cache extracted text in, keyed by file name, mtime and size
+        
+    Returns:
+        list: List of text from each page
+    """
+    cache_path = None
+    if cache_dir:
+        cache_key = f"{os.path.basename(pdf_path)}_{os.path.getmtime(pdf_path):.0f}_{os.path.getsize(pdf_path)}.json"
+        cache_path = os.path.join(cache_dir, cache_key)
+        if os.path.exists(cache_path):
+            with open(cache_path, "r") as file:
+                return json.load(file)
+    
+    try:
+        # First try regular PDF extraction
+        with open(pdf_path, "rb") as file:
+            reader = PyPDF2.PdfReader(file, strict=False)
+            pages = [page.extract_text() for page in reader.pages]
+            
+        # Use OCR only for the pages that have no text
+        empty_pages = [page_num for page_num, page in enumerate(pages) if not page.strip()]
+        if empty_pages:
+            logger.info(f"Using OCR for {len(empty_pages)}/{len(pages)} pages of {pdf_path} as they have no text")
+            for page_num, page_img in zip(empty_pages, render_pdf_images(pdf_path, empty_pages, dpi=200)):
+                text = pytesseract.image_to_string(page_img)
+                pages[page_num] = f"--- Page {page_num + 1} ---\n{text}\n"
+    except Exception as e:
+        logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
+        traceback.print_exc()
+        return []
+    
+    # Write the cache atomically so an interrupted run never leaves a partial file
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(pages, file)
+        os.replace(tmp_path, cache_path)
+    
+    return pages
+
+def save_embedding_int8(embedding, path):
+    """
+    Save a multi-vector embedding as int8 with one fp16 scale per vector.
+    
+    Args:
+        embedding (torch.Tensor): Embedding of shape (..., dim)
+        path (str): Destination .npz file
+    """
+    embedding = embedding.float()
+    scale = embedding.abs().amax(dim=-1, keepdim=True) / 127.0
+    quantized = torch.round(embedding / scale.clamp(min=1e-12)).clamp(-127, 127).to(torch.int8)
+    np.savez(path, q=quantized.numpy(), s=scale.half().numpy())
+
+def load_embedding_int8(path):
+    """
+    Load an embedding saved by save_embedding_int8.
+    
+    Args:
+        path (str): Path to the .npz file
+        
+    Returns:
+        torch.Tensor: Dequantised bf16 embedding
+    """
+    with np.load(path) as data:
+        quantized = torch.from_numpy(data["q"])
+        scale = torch.from_numpy(data["s"])
+    return quantized.to(torch.bfloat16) * scale.to(torch.bfloat16)
+
+def count_pdf_pages(pdf_path):
+    """
+    Count the pages of a PDF.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        
+    Returns:
+        int: Number of pages
+    """
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    return pdfinfo_from_path(pdf_path)["Pages"]
+
+def render_pdf_images(pdf_path, page_indices, dpi=200):
+    """
+    Render PDF pages to PIL images one at a time, opening the document once.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        page_indices (list): Zero-based page numbers to render
+        dpi (int): Rendering resolution
+        
+    Yields:
+        PIL.Image.Image: The rendered page, in the order of page_indices
+    """
+    if pdfium is None:
+        for page_idx in page_indices:
+            yield convert_from_path(pdf_path, dpi=dpi, first_page=page_idx + 1, last_page=page_idx + 1)[0]
+        return
+    
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        for page_idx in page_indices:
+            yield pdf[page_idx].render(scale=dpi / 72).to_pil()
+    finally:
+        pdf.close()
+
+def render_pdf_pages(pdf_path, image_dir, dpi=200, thread_count=1):
+    """
+    Render every page of a PDF to `{image_dir}/{page_idx}.png`, reusing pages rendered earlier.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        image_dir (str): Directory holding the rendered pages of this PDF
+        dpi (int): Rendering resolution
+        thread_count (int): Number of pdftoppm processes to render with (pdf2image only)
+        
+    Returns:
+        list: Paths to the page images in page order
+    """
+    num_pages = count_pdf_pages(pdf_path)
+    image_paths = [os.path.join(image_dir, f"{page_idx}.png") for page_idx in range(num_pages)]
+    missing_pages = [page_idx for page_idx, image_path in enumerate(image_paths) if not os.path.exists(image_path)]
+    if not missing_pages:
+        return image_paths
+    
+    os.makedirs(image_dir, exist_ok=True)
+    if pdfium is not None:
+        # Render only the missing pages in-process, writing each atomically
+        for page_idx, image in zip(missing_pages, render_pdf_images(pdf_path, missing_pages, dpi)):
+            tmp_path = f"{image_paths[page_idx]}.{os.getpid()}.tmp"
+            image.save(tmp_path, format="PNG")
+            os.replace(tmp_path, image_paths[page_idx])
+        return image_paths
+    
+    # Render into a scratch directory and move pages into place once complete
+    with tempfile.TemporaryDirectory(dir=image_dir) as render_dir:
+        rendered_paths = convert_from_path(
+            pdf_path, dpi=dpi, output_folder=render_dir, fmt="png", paths_only=True, thread_count=thread_count
+        )
+        for rendered_path, image_path in zip(rendered_paths, image_paths):
+            os.replace(rendered_path, image_path)
+    
+    return image_paths
+
+def render_pdf_page(pdf_path, image_dir, page_idx, dpi=200):
+    """
+    Render a single PDF page to `{image_dir}/{page_idx}.png` unless it is already there.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        image_dir (str): Directory holding the rendered pages of this PDF
+        page_idx (int): Zero-based page number
+        dpi (int): Rendering resolution
+        
+    Returns:
+        str: Path to the page image, or None if the page does not exist
+    """
+    image_path = os.path.join(image_dir, f"{page_idx}.png")
+    if os.path.exists(image_path):
+        return image_path
+    
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            image = pdf[page_idx].render(scale=dpi / 72).to_pil() if page_idx < len(pdf) else None
+        finally:
+            pdf.close()
+    else:
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page_idx + 1, last_page=page_idx + 1)
+        image = images[0] if images else None
+    if image is None:
+        return None
+    
+    os.makedirs(image_dir, exist_ok=True)
+    tmp_path = f"{image_path}.{os.getpid()}.tmp"
+    image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, image_path)
+    return image_path
+
+class PageImageDataset(torch.utils.data.IterableDataset):
+    """
+    Stream preprocessed batches of PDF page images for visual indexing.
+    
+    PDFs are sharded across DataLoader workers; each worker renders its PDFs
+    to the page image cache and loads one page at a time, so memory stays
+    bounded by the batch size.
+    """
+
+    def __init__(self, pdf_docs, processor, batch_size, image_root, dpi):
+        """
+        Args:
+            pdf_docs (list): List of (doc_id, pdf_path) tuples
+            processor: ColPali/ColQwen processor used to prepare images
+            batch_size (int): Number of pages per yielded batch
+            image_root (str): Root directory of the page image cache
+            dpi (int): Rendering resolution
+        """
+        self.pdf_docs = pdf_docs
+        self.processor = processor
+        self.batch_size = batch_size
+        self.image_root = image_root
+        self.dpi = dpi
+
+    def _process_batch(self, page_batch):
+        page_ids = [page_id for page_id, _ in page_batch]
+        try:
+            return page_ids, self.processor.process_images([page_img for _, page_img in page_batch])
+        except Exception as e:
+            logger.error(f"Error processing pages {page_ids}: {str(e)}")
+            traceback.print_exc()
+            return None
+
+    def __iter__(self):
+        worker_info = torch.utils.data.get_worker_info()
+        pdf_docs = self.pdf_docs if worker_info is None else self.pdf_docs[worker_info.id::worker_info.num_workers]
+        
+        page_batch = []
+        for doc_id, pdf_path in pdf_docs:
+            # Convert PDF to image files
+            try:
+                image_paths = render_pdf_pages(pdf_path, os.path.join(self.image_root, doc_id), self.dpi)
+            except Exception as e:
+                logger.error(f"Error converting PDF {pdf_path} to images: {str(e)}")
+                traceback.print_exc()
+                continue
+            
+            for page_idx, image_path in enumerate(image_paths):
+                # Skip only this page if its image is missing or unreadable
+                try:
+                    with Image.open(image_path) as img:
+                        page_img = img.convert("RGB")
+                except Exception as e:
+                    logger.error(f"Error loading page {page_idx} of {pdf_path}: {str(e)}")
+                    traceback.print_exc()
+                    continue
+                page_batch.append((f"{doc_id}_{page_idx}", page_img))
+                
+                if len(page_batch) == self.batch_size:
+                    batch = self._process_batch(page_batch)
+                    page_batch = []
+                    if batch is not None:
+                        yield batch
+        
+        # Yield any remaining pages
+        if page_batch:
+            batch = self._process_batch(page_batch)
+            if batch is not None:
+                yield batch
+
+def write_json(data, path):
+    """
+    Write data as indented JSON, atomically replacing any existing file.
+    
+    Args:
+        data: JSON-serialisable object
+        path (str): Destination file path
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if orjson is not None:
+        with open(tmp_path, "wb") as file:
+            file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(tmp_path, "w") as file:
+            json.dump(data, file, indent=4)
+    os.replace(tmp_path, path)
+
+def dump_json_line(data):
+    """
+    Serialise data as a single JSON line.
+    
+    Args:
+        data: JSON-serialisable object
+        
+    Returns:
+        bytes: Compact JSON followed by a newline
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+def read_jsonl(path):
+    """
+    Read a JSONL response file into a mapping keyed by query ID.
+    
+    Malformed lines, such as a record truncated by an interrupted run, are skipped.
+    
+    Args:
+        path (str): Path to the JSONL file
+        
+    Returns:
+        dict: Mapping of q_id to its most recent record
+    """
+    records = {}
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return records
+    
+    loads = orjson.loads if orjson is not None else json.loads
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for line in iter(mapped.readline, b""):
+            try:
+                record = loads(line)
+            except ValueError:
+                logger.warning(f"Skipping malformed line in {path}")
+                continue
+            records[record.get("q_id")] = record
+    return records
+
+def parse_documents(value):
+    """
+    Parse a `documents` cell holding a Python list literal.
+    
+    Args:
+        value: Raw cell value from the dataset CSV
+        
+    Returns:
+        list: Document names, or an empty list if the cell is missing or not a valid list
+    """
+    if not isinstance(value, str):
+        return []
+    try:
+        docs = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        logger.warning(f"Could not parse documents field: {value}")
+        return []
+    return list(docs) if isinstance(docs, (list, tuple, set)) else []
+
+def parse_answer(value):
+    """
+    Parse an `answer` cell that may hold a Python literal (e.g. a list of answers).
+    
+    Args:
+        value: Raw cell value from the dataset CSV
+        
+    Returns:
+        The parsed literal, or the value unchanged if it is not a valid literal
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return value
+
+def top_k_indices(scores, k):
+    """
+    Return the indices of the k highest scores, best first.
+    
+    Uses a partial sort so selection is linear in the number of scores.
+    
+    Args:
+        scores (np.ndarray): 1-D array of scores
+        k (int): Number of indices to return
+        
+    Returns:
+        np.ndarray: Indices of the top-k scores in descending score order
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return np.array([], dtype=int)
+    top_indices = np.argpartition(-scores, k - 1)[:k]
+    return top_indices[np.argsort(-scores[top_indices], kind="stable")]
+
+# Columns of the textual retrieval CSV needed to build contexts
+TEXT_RETRIEVAL_COLUMNS = ['q_id', 'rank', 'chunk', 'chunk_pdf_name', 'pdf_page_number', 'document_id', 'page_number']
+
+# Static instructions for the visual and textual answer prompts. Everything that varies per
+# query is appended after this prefix so LLM backends can reuse their prompt prefix cache.
+ANSWER_PROMPT_TEMPLATE = """
+You are tasked with answering a question based on the relevant {source} of a PDF document. Provide your response in the following format:
+## Evidence:
+
+## Chain of Thought:
+
+## Answer:
+
+___
+Instructions:
+
+1. Evidence Curation: Extract relevant elements (such as paragraphs, tables, figures, charts) from the provided {source} and populate them in the "Evidence" section. For each element, include the type, content, and a brief explanation of its relevance.
+
+2. Chain of Thought: In the "Chain of Thought" section, list out each logical step you take to derive the answer, referencing the evidence where applicable. You should perform computations if you need to to get to the answer. 
+
+3. Answer: {qa_prompt}
+___
+"""
+
+# Static instructions for the combination prompt; the question and both responses follow it
+COMBINE_PROMPT_PREFIX = """
+You will be given a question and two responses to it. Response 1 is based on a visual q/a pipeline, and Response 2 is based on a textual q/a pipeline. 
+- In general, given both response 1 and response 2 have logical chains of thoughts, and decision boils down to evidence, you should place higher degree of trust on evidence reported in Response 1.
+- If one of the responses has declined giving a clear answer, please weigh the other answer more unless there is reasonable thought to not answer, and both thoughts are inconsistent.
+- Language of the answer should be short and direct, usually answerable in a single sentence, or phrase. You should directly give the specific response to an answer.
+
+Consider both chains of thought and final answers. Provide your analysis in the following format:
+
+## Analysis:
+[Your detailed analysis here, evaluating the consistency of both the chains of thoughts, with respect to each other, the question and their respective answers, as well as validity of the evidence.]
+
+## Conclusion:
+[Your conclusion on which answer is more likely to be correct, or if a synthesis of both is needed]
+
+## Final Answer:
+[Answer the question based on your analysis of the two candidates so far. Please ensure that answers are short and concise, similar in language to the provided answers.]
+___
+"""
+
+# Section headings requested by the answer prompts
+SECTION_HEADING_RE = re.compile(r"##\s*(?P<heading>Evidence|Chain of Thought|Answer):")
+
+# Any "## Heading" line, as produced by the combination prompt
+MARKDOWN_HEADING_RE = re.compile(r"^## (.*)$", re.MULTILINE)
+
+class CachedEmbeddingFunction:
+    """Chroma embedding function that memoises another embedding function on disk, keyed by text hash."""
+
+    def __init__(self, embedding_function, cache, model_name):
+        """
+        Args:
+            embedding_function (callable): Embedding function to wrap
+            cache (diskcache.Cache): Persistent cache to store embeddings in
+            model_name (str): Model name, included in the cache key
+        """
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.model_name = model_name
+
+    def __call__(self, input):
+        keys = [hashlib.sha256(f"{self.model_name}\n{text}".encode()).hexdigest() for text in input]
+        embeddings = [self.cache.get(key) for key in keys]
+        
+        # Embed only the texts that are not cached yet, in a single call
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self.embedding_function([input[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                self.cache[keys[i]] = embedding
+                embeddings[i] = embedding
+        
+        return embeddings
+
 class VisDoMRAG:
     def __init__(self, config):
         """
@@ -71,20 +572,54 @@ class VisDoMRAG:
         self.chunk_size = config.get("chunk_size", 3000)
         self.chunk_overlap = config.get("chunk_overlap", 300)
         self.force_reindex = config.get("force_reindex", False)
+        self.num_workers = config.get("num_workers", os.cpu_count())
+        self.vision_batch_size = config.get("vision_batch_size", 8)
+        self.loader_workers = config.get("loader_workers", 4)
+        self.page_dpi = config.get("page_dpi", 200)
+        self.page_image_cache_size = config.get("page_image_cache_size", 32)
+        self.encoded_image_cache_size = config.get("encoded_image_cache_size", 256)
+        self.prerender_pages = config.get("prerender_pages", True)
+        self.upload_images = config.get("upload_images", False)
+        self.output_format = config.get("output_format", "json")
+        self.quantize_vision = config.get("quantize_vision", False)
+        self.compile_vision = config.get("compile_vision", False)
+        self.max_concurrency = config.get("max_concurrency", 16)
+        self.requests_per_minute = config.get("requests_per_minute", None)
+        self.enable_cache = config.get("enable_cache", False)
+        self.qwen_batch_size = config.get("qwen_batch_size", 8)
+        self.gc_interval = config.get("gc_interval", 100)
+        self.cuda_memory_threshold = config.get("cuda_memory_threshold", 0.9)
+        self._queries_since_gc = 0
         self.qa_prompt = config.get("qa_prompt", "Answee the question objectively based on the context provided.")
+        
+        # Static prompt prefixes, built once; per-query content is appended after them
+        self._visual_prompt_prefix = ANSWER_PROMPT_TEMPLATE.format(source="pages", qa_prompt=self.qa_prompt)
+        self._textual_prompt_prefix = ANSWER_PROMPT_TEMPLATE.format(source="chunks", qa_prompt=self.qa_prompt)
         self.dataset_csv = config.get("csv_path")
         if not self.dataset_csv:
             # Fallback to old behavior if csv_path not provided
             self.dataset_csv = f"{self.data_dir}/{os.path.basename(self.data_dir)}.csv"
         
         # Setup output directories
-        os.makedirs(f"{self.output_dir}/{self.llm_model}_vision", exist_ok=True)
-        os.makedirs(f"{self.output_dir}/{self.llm_model}_text", exist_ok=True)
-        os.makedirs(f"{self.output_dir}/{self.llm_model}_visdmrag", exist_ok=True)
+        if self.output_format == "jsonl":
+            os.makedirs(self.output_dir, exist_ok=True)
+        elif self.output_format == "json":
+            os.makedirs(f"{self.output_dir}/{self.llm_model}_vision", exist_ok=True)
+            os.makedirs(f"{self.output_dir}/{self.llm_model}_text", exist_ok=True)
+            os.makedirs(f"{self.output_dir}/{self.llm_model}_visdmrag", exist_ok=True)
+        else:
+            raise ValueError(f"Unsupported output format: {self.output_format}")
+        
+        # JSONL outputs: saved records per response kind (loaded lazily) and open append handles
+        self._jsonl_records = {}
+        self._jsonl_files = {}
         
         # Create retrieval directories
         os.makedirs(f"{self.data_dir}/retrieval", exist_ok=True)
         
+        # Rendered PDF pages are cached per DPI and shared by indexing and retrieval
+        self.page_image_dir = os.path.join(self.data_dir, "page_images", str(self.page_dpi))
+        
         # Initialize LLM
         self._initialize_llm()
         
@@ -94,9 +629,63 @@ class VisDoMRAG:
             raise FileNotFoundError(f"CSV file not found: {self.dataset_csv}")
         self.df = pd.read_csv(self.dataset_csv)
         
+        # Parse the documents lists once instead of on every row access
+        if 'documents' in self.df.columns:
+            self.df['documents_parsed'] = self.df['documents'].map(parse_documents)
+        else:
+            self.df['documents_parsed'] = [[] for _ in range(len(self.df))]
+        if 'answer' in self.df.columns:
+            self.df['parsed_answer'] = self.df['answer'].map(parse_answer)
+        else:
+            self.df['parsed_answer'] = None
+        self.df_by_qid = self.df.drop_duplicates('q_id').set_index('q_id', drop=False)
+        
         # Initialize document cache
         self.document_cache = {}
         
+        # Text splitter is reused for every page
+        self._text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+        )
+        
+        # Event loop reused across calls so async clients stay bound to one loop
+        self._loop = None
+        
+        # Base64 page encodings reused across queries, most recently used last
+        self._encoded_images = OrderedDict()
+        
+        # Decoded page images reused across queries, most recently used last
+        self._page_images = OrderedDict()
+        
+        # Gemini file uploads (as pending tasks) keyed by (document_id, page_number)
+        self._uploaded_images = {}
+        
+        # Retrieval results grouped by query, loaded on first use
+        self._visual_by_qid = None
+        self._text_by_qid = None
+        self._prepare_lock = threading.Lock()
+        
+        # Indexes are built at most once per instance, even with force_reindex
+        self._visual_index_built = False
+        self._text_index_built = False
+        
+        # Token-bucket limit on API requests; the local Qwen model is not limited
+        self._limiter = None
+        if self.requests_per_minute and self.llm_model != "qwen":
+            try:
+                self._limiter = AsyncLimiter(self.requests_per_minute, time_period=60)
+            except NameError:
+                raise ImportError("aiolimiter not found. Install aiolimiter or unset requests_per_minute.")
+        
+        # Initialize persistent response/embedding cache
+        self._cache = None
+        if self.enable_cache:
+            try:
+                self._cache = diskcache.Cache(os.path.join(self.output_dir, "llm_cache"))
+            except NameError:
+                raise ImportError("diskcache not found. Install diskcache or disable enable_cache.")
+        
         # Initialize retrieval resources
         self._initialize_retrieval_resources()
         
@@ -112,8 +701,9 @@ class VisDoMRAG:
         elif self.llm_model == "gpt4":
             if not self.api_keys.get("openai"):
                 raise ValueError("OpenAI API key is required")
-            from openai import OpenAI
+            from openai import OpenAI, AsyncOpenAI
             self.client = OpenAI(api_key=self.api_keys["openai"])
+            self.aclient = AsyncOpenAI(api_key=self.api_keys["openai"])
             logger.info("Initialized GPT-4 (via OpenAI client)")
         
         elif self.llm_model == "qwen":
@@ -135,12 +725,43 @@ class VisDoMRAG:
                     max_pixels=max_pixels
                 )
                 self.process_vision_info = process_vision_info
+                
+                # Batched generation needs left padding so outputs follow each prompt directly
+                self.qwen_processor.tokenizer.padding_side = "left"
+                self._qwen_pending = []
+                self._qwen_lock = None
                 logger.info("Initialized Qwen2-VL model")
             except ImportError:
                 raise ImportError("Required packages for Qwen not found. Install transformers and qwen_vl_utils.")
         else:
             raise ValueError(f"Unsupported LLM model: {self.llm_model}")
     
+    def _vision_model_kwargs(self, flash_attention=False):
+        """
+        Build from_pretrained arguments for the visual retriever.
+        
+        Args:
+            flash_attention (bool): Whether the model supports flash-attention 2
+            
+        Returns:
+            dict: Keyword arguments for from_pretrained
+        """
+        kwargs = {"torch_dtype": torch.bfloat16, "device_map": "cuda"}
+        
+        if flash_attention:
+            from transformers.utils import is_flash_attn_2_available
+            if is_flash_attn_2_available():
+                kwargs["attn_implementation"] = "flash_attention_2"
+        
+        if self.quantize_vision:
+            try:
+                from transformers import BitsAndBytesConfig
+                kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+            except ImportError:
+                raise ImportError("INT8 quantization requires transformers with bitsandbytes installed.")
+        
+        return kwargs
+    
     def _initialize_retrieval_resources(self):
         """Initialize resources needed for retrieval."""
         # Check if we need to compute visual embeddings
@@ -156,8 +777,7 @@ class VisDoMRAG:
                     logger.info("Loading ColPali model for visual indexing")
                     self.vision_model = ColPali.from_pretrained(
                         "vidore/colpali-v1.2", 
-                        torch_dtype=torch.bfloat16, 
-                        device_map="cuda"
+                        **self._vision_model_kwargs()
                     ).eval()
                     self.vision_processor = ColPaliProcessor.from_pretrained("vidore/colpali-v1.2")
                 except ImportError:
@@ -168,12 +788,15 @@ class VisDoMRAG:
                     logger.info("Loading ColQwen model for visual indexing")
                     self.vision_model = ColQwen2.from_pretrained(
                         "vidore/colqwen2-v0.1", 
-                        torch_dtype=torch.bfloat16, 
-                        device_map="cuda"
+                        **self._vision_model_kwargs(flash_attention=True)
                     ).eval()
                     self.vision_processor = ColQwen2Processor.from_pretrained("vidore/colqwen2-v0.1")
                 except ImportError:
                     raise ImportError("ColPali/ColQwen models not found. Please install colpali_engine.")
+            
+            if self.compile_vision:
+                # Removes per-op Python dispatch; recompiles once per distinct batch shape
+                self.vision_model = torch.compile(self.vision_model, dynamic=False, mode="reduce-overhead")
         else:
             raise ValueError(f"Unsupported visual retriever: {self.vision_retriever}")
     
@@ -194,6 +817,10 @@ class VisDoMRAG:
             self.st_embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
                 model_name=self.text_model_name, device=self.device
             )
+            if self._cache is not None:
+                self.st_embedding_function = CachedEmbeddingFunction(
+                    self.st_embedding_function, self._cache, self.text_model_name
+                )
         else:
             raise ValueError(f"Unsupported text retriever: {self.text_retriever}")
 
@@ -207,26 +834,7 @@ class VisDoMRAG:
         Returns:
             list: List of text from each page
         """
-        try:
-            # First try regular PDF extraction
-            with open(pdf_path, "rb") as file:
-                reader = PyPDF2.PdfReader(file, strict=False)
-                pages = [page.extract_text() for page in reader.pages]
-                
-            # If any page has no text, use OCR
-            if any(not page.strip() for page in pages):
-                logger.info(f"Using OCR for {pdf_path} as some pages have no text")
-                pages = []
-                pdf_images = convert_from_path(pdf_path)
-                for page_num, page_img in enumerate(pdf_images):
-                    text = pytesseract.image_to_string(page_img)
-                    pages.append(f"--- Page {page_num + 1} ---\n{text}\n")
-            
-            return pages
-        except Exception as e:
-            logger.error(f"Error extracting text from {pdf_path}: {str(e)}")
-            traceback.print_exc()
-            return []
+        return extract_text_from_pdf(pdf_path, cache_dir=os.path.join(self.data_dir, "text_cache"))
     
     def split_text(self, text):
         """
@@ -238,11 +846,7 @@ class VisDoMRAG:
         Returns:
             list: List of text chunks
         """
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-        )
-        return text_splitter.split_text(text)
+        return self._text_splitter.split_text(text)
     
     def cache_documents(self):
         """
@@ -256,17 +860,11 @@ class VisDoMRAG:
         try:
             # Extract unique document IDs from the dataset
             unique_docs = set()
-            for _, row in self.df.iterrows():
-                try:
-                    docs = eval(row['documents']) if 'documents' in row else []
-                    unique_docs.update(docs)
-                except:
-                    # Handle case where 'documents' field is not a valid list
-                    traceback.print_exc()
-                    pass
-                
-                if 'doc_path' in row:
-                    doc_path = row['doc_path']
+            for docs in self.df['documents_parsed']:
+                unique_docs.update(docs)
+            
+            if 'doc_path' in self.df.columns:
+                for doc_path in self.df['doc_path']:
                     if isinstance(doc_path, str) and doc_path.strip():
                         unique_docs.add(os.path.basename(doc_path).split('.')[0])
             
@@ -274,7 +872,11 @@ class VisDoMRAG:
             cache = {}
             pdf_dir = os.path.join(self.data_dir, "docs")
             
-            for doc_id in tqdm(unique_docs, desc="Caching documents"):
+            # Resolve a PDF path for each document first
+            doc_ids = []
+            pdf_paths = []
+            # Sorted so the cache (and the chunk order derived from it) is the same on every run
+            for doc_id in sorted(unique_docs):
                 # Try different possible filename formats
                 possible_paths = [
                     os.path.join(pdf_dir, doc_id),
@@ -285,11 +887,19 @@ class VisDoMRAG:
                 
                 for pdf_path in possible_paths:
                     if os.path.exists(pdf_path):
-                        cache[doc_id] = self.extract_text_from_pdf(pdf_path)
+                        doc_ids.append(doc_id)
+                        pdf_paths.append(pdf_path)
                         break
                 else:
                     logger.warning(f"No PDF file found for document {doc_id}")
             
+            # Extract text in parallel, one Tesseract process per core
+            with ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_extraction_worker) as executor:
+                extract = partial(extract_text_from_pdf, cache_dir=os.path.join(self.data_dir, "text_cache"))
+                extracted = executor.map(extract, pdf_paths, chunksize=4)
+                for doc_id, pages in tqdm(zip(doc_ids, extracted), total=len(doc_ids), desc="Caching documents"):
+                    cache[doc_id] = pages
+            
             self.document_cache = cache
             logger.info(f"Cached content for {len(cache)} documents")
             return cache
@@ -303,6 +913,10 @@ class VisDoMRAG:
         """
         Identify which document and page a chunk belongs to.
         
+        Fuzzy-matches the chunk against every cached page, so it is slow on
+        large corpora. build_text_index no longer needs it since chunks are
+        split per page; it is kept for chunks of unknown origin.
+        
         Args:
             chunk (str): Text chunk
             
@@ -321,32 +935,116 @@ class VisDoMRAG:
         
         return best_match
     
+    def _encode_vision_batch(self, processed):
+        """
+        Run a processed batch of images or queries through the visual retriever.
+        
+        Args:
+            processed (dict): Model inputs returned by the vision processor
+            
+        Returns:
+            torch.Tensor: Embeddings on CPU, one entry per batch item
+        """
+        processed = {k: v.to(self.vision_model.device, non_blocking=True) for k, v in processed.items()}
+        with torch.no_grad(), torch.autocast(device_type=self.vision_model.device.type, dtype=torch.bfloat16):
+            embeddings = self.vision_model(**processed)
+        return embeddings.cpu()
+    
+    def _page_embedding_dir(self, output_dir, pdf_path, doc_id):
+        """
+        Directory holding the page embeddings of one PDF, keyed by its name, mtime and size.
+        
+        Args:
+            output_dir (str): Embedding directory of the current retriever
+            pdf_path (str): Path to the PDF file
+            doc_id (str): Document ID
+            
+        Returns:
+            str: Path to the PDF's embedding directory
+        """
+        return os.path.join(output_dir, f"{doc_id}_{os.path.getmtime(pdf_path):.0f}_{os.path.getsize(pdf_path)}")
+    
+    def _load_page_embeddings(self, pdf_path, doc_id, embedding_dir):
+        """
+        Load previously saved embeddings for every page of a PDF.
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            doc_id (str): Document ID used in the page IDs
+            embedding_dir (str): Directory the PDF's page embeddings were saved to
+            
+        Returns:
+            dict: Mapping of page IDs to embeddings, or None if any page is missing
+        """
+        try:
+            num_pages = count_pdf_pages(pdf_path)
+        except Exception:
+            return None
+        
+        embedding_files = [os.path.join(embedding_dir, f"{page_idx}.npz") for page_idx in range(num_pages)]
+        if not embedding_files or not all(os.path.exists(f) for f in embedding_files):
+            return None
+        
+        return {
+            f"{doc_id}_{page_idx}": load_embedding_int8(embedding_file)
+            for page_idx, embedding_file in enumerate(embedding_files)
+        }
+    
+    def _embed_page_batch(self, page_ids, processed_images, embedding_dirs, page_embeddings):
+        """
+        Embed a batch of preprocessed page images and save one embedding file per page.
+        
+        Args:
+            page_ids (list): Page IDs in batch order
+            processed_images (dict): Model inputs returned by the vision processor
+            embedding_dirs (dict): Mapping of document IDs to the directory their embeddings are saved in
+            page_embeddings (dict): Mapping of page IDs to embeddings, updated in place
+        """
+        try:
+            embeddings = self._encode_vision_batch(processed_images)
+            
+            for i, page_id in enumerate(page_ids):
+                embedding = embeddings[i:i + 1].clone()
+                
+                # Save int8-quantised embedding to file
+                doc_id, page_idx = page_id.rsplit('_', 1)
+                embedding_file = os.path.join(embedding_dirs[doc_id], f"{page_idx}.npz")
+                save_embedding_int8(embedding, embedding_file)
+                
+                # Save embedding for multi-vector scoring
+                page_embeddings[page_id] = embedding
+        except Exception as e:
+            logger.error(f"Error processing pages {page_ids}: {str(e)}")
+            traceback.print_exc()
+    
     def build_visual_index(self):
         """
         Build visual embedding index for all PDFs in the dataset using multi-vector scoring.
         
+        The index is built at most once per pipeline instance; later calls are no-ops.
+        
         Returns:
             bool: Success status
         """
+        if self._visual_index_built:
+            return True
+        
         logger.info(f"Building visual index using {self.vision_retriever}")
         
         try:
             pdf_dir = os.path.join(self.data_dir, "docs")
-            output_dir = os.path.join(self.data_dir, "visual_embeddings")
+            # Embeddings from different retrievers or precisions must never be mixed
+            retriever_tag = f"{self.vision_retriever}_int8" if self.quantize_vision else self.vision_retriever
+            output_dir = os.path.join(self.data_dir, "visual_embeddings", retriever_tag)
             os.makedirs(output_dir, exist_ok=True)
             
             # Extract unique document IDs from the dataset
             unique_docs = set()
-            for _, row in self.df.iterrows():
-                try:
-                    docs = eval(row['documents']) if 'documents' in row else []
-                    unique_docs.update(docs)
-                except:
-                    traceback.print_exc()
-                    pass
-                
-                if 'doc_path' in row:
-                    doc_path = row['doc_path']
+            for docs in self.df['documents_parsed']:
+                unique_docs.update(docs)
+            
+            if 'doc_path' in self.df.columns:
+                for doc_path in self.df['doc_path']:
                     if isinstance(doc_path, str) and doc_path.strip():
                         unique_docs.add(os.path.basename(doc_path))
             
@@ -361,9 +1059,11 @@ class VisDoMRAG:
             # Track all generated embeddings
             page_embeddings = {}
             document_page_map = {}
+            pdf_docs = []
+            embedding_dirs = {}
             
-            # Process each PDF
-            for pdf_file in tqdm(pdf_files, desc="Processing PDFs for visual index"):
+            # Collect the PDFs that need to be embedded
+            for pdf_file in pdf_files:
                 doc_id = os.path.splitext(pdf_file)[0]
                 pdf_path = os.path.join(pdf_dir, pdf_file)
                 
@@ -372,136 +1072,118 @@ class VisDoMRAG:
                     logger.warning(f"PDF file not found: {pdf_path}")
                     continue
                 
-                # Convert PDF to images
-                try:
-                    pages = convert_from_path(pdf_path)
-                except Exception as e:
-                    logger.error(f"Error converting PDF {pdf_file} to images: {str(e)}")
-                    traceback.print_exc()
-                    continue
-                
-                # Process each page
-                for page_idx, page_img in enumerate(pages):
-                    page_id = f"{doc_id}_{page_idx}"
-                    document_page_map[page_id] = {"doc_id": doc_id, "page_idx": page_idx}
-                    
-                    # Process and embed the image
-                    try:
-                        if self.vision_retriever in ["colpali", "colqwen"]:
-                            # Process the image into model-compatible input
-                            processed_image = self.vision_processor.process_images([page_img])
-                            processed_image = {k: v.to(self.vision_model.device) for k, v in processed_image.items()}
-                            
-                            # Generate embedding
-                            with torch.no_grad():
-                                embedding = self.vision_model(**processed_image)
-                            
-                            # Save embedding to file
-                            embedding_file = os.path.join(output_dir, f"{page_id}.pt")
-                            torch.save(embedding.cpu(), embedding_file)
-                            
-                            # Save embedding for multi-vector scoring
-                            page_embeddings[page_id] = embedding.cpu()
-                    except Exception as e:
-                        logger.error(f"Error processing page {page_idx} of PDF {pdf_file}: {str(e)}")
-                        traceback.print_exc()
+                # Reuse saved embeddings when every page of this PDF already has one
+                embedding_dir = self._page_embedding_dir(output_dir, pdf_path, doc_id)
+                if not self.force_reindex:
+                    saved_embeddings = self._load_page_embeddings(pdf_path, doc_id, embedding_dir)
+                    if saved_embeddings is not None:
+                        for page_idx, (page_id, embedding) in enumerate(saved_embeddings.items()):
+                            document_page_map[page_id] = {"doc_id": doc_id, "page_idx": page_idx}
+                            page_embeddings[page_id] = embedding
                         continue
+                
+                os.makedirs(embedding_dir, exist_ok=True)
+                embedding_dirs[doc_id] = embedding_dir
+                pdf_docs.append((doc_id, pdf_path))
+            
+            # Rasterise and preprocess pages in loader workers while the GPU embeds earlier batches
+            page_loader = torch.utils.data.DataLoader(
+                PageImageDataset(pdf_docs, self.vision_processor, self.vision_batch_size, self.page_image_dir, self.page_dpi),
+                batch_size=None,
+                num_workers=self.loader_workers,
+                pin_memory=torch.cuda.is_available()
+            )
             
-            # Generate query embeddings
+            for num_batches, (page_ids, processed_images) in enumerate(
+                tqdm(page_loader, desc="Processing PDF pages for visual index"), start=1
+            ):
+                for page_id in page_ids:
+                    doc_id, page_idx = page_id.rsplit('_', 1)
+                    document_page_map[page_id] = {"doc_id": doc_id, "page_idx": int(page_idx)}
+                
+                self._embed_page_batch(page_ids, processed_images, embedding_dirs, page_embeddings)
+                if num_batches % 50 == 0 and torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            
+            # Generate query embeddings in batches
             query_embeddings = {}
-            for _, row in tqdm(self.df.iterrows(), desc="Processing queries for visual index"):
-                q_id = row['q_id']
-                question = row['question']
+            q_ids = self.df['q_id'].tolist()
+            questions = self.df['question'].tolist()
+            for start in tqdm(range(0, len(q_ids), self.vision_batch_size), desc="Processing queries for visual index"):
+                batch_q_ids = q_ids[start:start + self.vision_batch_size]
+                batch_questions = questions[start:start + self.vision_batch_size]
                 
                 try:
-                    # Process the question
-                    processed_query = self.vision_processor.process_queries([question])
-                    processed_query = {k: v.to(self.vision_model.device) for k, v in processed_query.items()}
-                    
-                    # Generate embedding
-                    with torch.no_grad():
-                        embedding = self.vision_model(**processed_query)
-                    
-                    query_embeddings[q_id] = embedding.cpu()
+                    # Process the questions and generate embeddings
+                    processed_queries = self.vision_processor.process_queries(batch_questions)
+                    embeddings = self._encode_vision_batch(processed_queries)
                     
-                    # Save query embedding for future use
-                    query_embedding_file = os.path.join(output_dir, f"query_{q_id}.pt")
-                    torch.save(embedding.cpu(), query_embedding_file)
+                    for i, q_id in enumerate(batch_q_ids):
+                        embedding = embeddings[i:i + 1].clone()
+                        query_embeddings[q_id] = embedding
+                        
+                        # Save query embedding for future use
+                        query_embedding_file = os.path.join(output_dir, f"query_{q_id}.pt")
+                        torch.save(embedding, query_embedding_file)
                 except Exception as e:
-                    logger.error(f"Error generating embedding for query {q_id}: {str(e)}")
+                    logger.error(f"Error generating embeddings for queries {batch_q_ids}: {str(e)}")
                     traceback.print_exc()
             
-            # Use multi-vector scoring to rank documents for each query
+            # Look up each query's question and relevant documents once
+            all_docs = [os.path.splitext(f)[0] for f in pdf_files]
+            query_info = {}
+            for q_id in query_embeddings:
+                document_info = self.df_by_qid.loc[q_id]
+                
+                # Get relevant documents for this query based on the dataset
+                relevant_docs = [doc.split(".pdf")[0] for doc in document_info['documents_parsed']]
+                # elif 'doc_path' in document_info:
+                #     doc_path = document_info['doc_path']
+                #     if isinstance(doc_path, str) and doc_path.strip():
+                #         doc_id = os.path.basename(doc_path).split('.')[0]
+                #         relevant_docs.append(doc_id)
+                
+                if not relevant_docs:
+                    relevant_docs = all_docs
+                
+                query_info[q_id] = (document_info['question'], set(relevant_docs))
+            
+            # Score every query against every page in a single batched call on the model's device
+            page_ids = list(page_embeddings.keys())
+            page_doc_ids = np.array([page_id.rsplit('_', 1)[0] for page_id in page_ids])
+            scored_q_ids = list(query_embeddings.keys())
+            all_scores = None
+            if page_ids and scored_q_ids:
+                all_scores = self.vision_processor.score_multi_vector(
+                    [query_embeddings[q_id][0] for q_id in scored_q_ids],
+                    [page_embeddings[page_id][0] for page_id in page_ids],
+                    device=self.vision_model.device
+                )
+                all_scores = all_scores.float().cpu().numpy()
+            
+            # Rank the relevant pages for each query
             results = []
-            for q_id, query_emb in tqdm(query_embeddings.items(), desc="Ranking documents for queries"):
+            for row_idx, q_id in enumerate(tqdm(scored_q_ids, desc="Ranking documents for queries")):
                 try:
-                    # Extract document information
-                    document_info = None
-                    for _, row in self.df.iterrows():
-                        if row['q_id'] == q_id:
-                            document_info = row
-                            break
-                    
-                    if document_info is None:
-                        continue
-                    
-                    question = document_info['question']
-                    
-                    # Get relevant documents for this query based on the dataset
-                    relevant_docs = []
-                    if 'documents' in document_info:
-                        try:
-                            docs = eval(document_info['documents'])
-                            relevant_docs = [doc.split(".pdf")[0] for doc in docs]
-                        except:
-                            # If documents field is not valid, use all documents
-                            traceback.print_exc()
-                            relevant_docs = [os.path.splitext(f)[0] for f in pdf_files]
-                    # elif 'doc_path' in document_info:
-                    #     doc_path = document_info['doc_path']
-                    #     if isinstance(doc_path, str) and doc_path.strip():
-                    #         doc_id = os.path.basename(doc_path).split('.')[0]
-                    #         relevant_docs.append(doc_id)
-                    
-                    if not relevant_docs:
-                        relevant_docs = [os.path.splitext(f)[0] for f in pdf_files]
+                    question, relevant_docs = query_info[q_id]
                     
-                    # Filter page embeddings to only include relevant documents
-                    relevant_page_embeddings = {}
-                    for page_id, embedding in page_embeddings.items():
-                        doc_id = page_id.rsplit('_', 1)[0]
-                        if doc_id in relevant_docs:
-                            relevant_page_embeddings[page_id] = embedding
+                    # Filter pages to only include relevant documents
+                    relevant_indices = np.flatnonzero(np.isin(page_doc_ids, list(relevant_docs)))
                     
-                    # Prepare for multi-vector scoring
-                    qs = query_emb  # Query in batch format
-                    ds = torch.cat([emb for emb in relevant_page_embeddings.values()], dim=0)
-                    
-                    print(qs[0].shape)
-                    print(ds[0].shape)
-                    print(ds[1].shape)
-                    print(len(ds))
-
-
-                    if len(ds) == 0:
+                    if len(relevant_indices) == 0:
                         logger.warning(f"No relevant document embeddings found for query {q_id}")
                         continue
                     
-                    # Run the multi-vector scoring
-                    scores = self.vision_processor.score_multi_vector(qs, ds)
-                    scores = scores.flatten().numpy()
+                    scores = all_scores[row_idx, relevant_indices]
                     
                     # Get indices of scores in descending order
                     top_indices = np.argsort(-scores)
                     
-                    # Map indices to document IDs
-                    ranked_docs = np.array(list(relevant_page_embeddings.keys()))[top_indices]
-                    
                     # Store results for each ranked document
-                    for doc_id, score in zip(ranked_docs, scores[top_indices]):
+                    for page_idx, score in zip(relevant_indices[top_indices], scores[top_indices]):
                         results.append({
                             'q_id': q_id,
-                            'document_id': doc_id,
+                            'document_id': page_ids[page_idx],
                             'score': float(score),
                             'question': question
                         })
@@ -511,13 +1193,11 @@ class VisDoMRAG:
                     traceback.print_exc()
             
             # Save results to CSV
-            with open(self.vision_retrieval_file, 'w', newline='') as csvfile:
-                fieldnames = ['q_id', 'document_id', 'score', 'question']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(results)
+            fieldnames = ['q_id', 'document_id', 'score', 'question']
+            pd.DataFrame(results, columns=fieldnames).to_csv(self.vision_retrieval_file, index=False)
             
             logger.info(f"Visual index saved to {self.vision_retrieval_file}")
+            self._visual_index_built = True
             return True
             
         except Exception as e:
@@ -529,9 +1209,14 @@ class VisDoMRAG:
         """
         Build text index for all documents in the dataset.
         
+        The index is built at most once per pipeline instance; later calls are no-ops.
+        
         Returns:
             bool: Success status
         """
+        if self._text_index_built:
+            return True
+        
         logger.info(f"Building text index using {self.text_retriever}")
         
         try:
@@ -543,34 +1228,37 @@ class VisDoMRAG:
             all_chunks = []
             chunk_to_doc_mapping = []
             
-            for doc_id, pages in tqdm(self.document_cache.items(), desc="Processing documents for text index"):
-                all_text = "\n".join(pages)
-                chunks = self.split_text(all_text)
-                
-                for chunk in chunks:
-                    all_chunks.append(chunk)
-                    arxiv_id, page_num = self.identify_document_and_page(chunk)
-                    chunk_to_doc_mapping.append({
-                        'chunk': chunk,
-                        'chunk_pdf_name': arxiv_id if arxiv_id else doc_id,
-                        'pdf_page_number': page_num if page_num is not None else 0
-                    })
+            # Deterministic chunk order keeps chunk IDs and the corpus hash stable across runs
+            for doc_id, pages in tqdm(sorted(self.document_cache.items()), desc="Processing documents for text index"):
+                # Split each page separately so the source page of every chunk is known
+                for page_num, page_text in enumerate(pages):
+                    for chunk in self.split_text(page_text):
+                        all_chunks.append(chunk)
+                        chunk_to_doc_mapping.append({
+                            'chunk': chunk,
+                            'chunk_pdf_name': doc_id,
+                            'pdf_page_number': page_num
+                        })
             
             # Initialize retriever based on selected method
             if self.text_retriever == "bm25":
                 # BM25 indexing
-                bm25_model = BM25Okapi([chunk.split() for chunk in all_chunks])
+                tokenized_chunks = [chunk.split() for chunk in all_chunks]
+                bm25_model = BM25Okapi(tokenized_chunks)
+                
+                # Tokenize all questions up front
+                tokenized_questions = [
+                    (q_id, question, question.split() if isinstance(question, str) else [])
+                    for q_id, question in zip(self.df['q_id'].tolist(), self.df['question'].tolist())
+                ]
                 
                 # Process each query
                 results = []
-                for _, row in tqdm(self.df.iterrows(), desc="Processing queries for BM25"):
-                    q_id = row['q_id']
-                    question = row['question']
-                    
+                for q_id, question, query_tokens in tqdm(tokenized_questions, desc="Processing queries for BM25"):
                     # Get BM25 scores
                     try:
-                        scores = bm25_model.get_scores(question.split())
-                        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:self.top_k*2]
+                        scores = np.asarray(bm25_model.get_scores(query_tokens))
+                        top_indices = top_k_indices(scores, self.top_k*2)
                         
                         for rank, idx in enumerate(top_indices):
                             chunk_info = chunk_to_doc_mapping[idx]
@@ -588,60 +1276,92 @@ class VisDoMRAG:
                         traceback.print_exc()
                 
             elif self.text_retriever in ["minilm", "mpnet", "bge"]:
-                # Create Chroma collection with sentence transformer embeddings
-                chroma_client = chromadb.Client()
-                collection_name = f"st_col_{uuid.uuid4().hex[:8]}"
-                collection = chroma_client.create_collection(
-                    collection_name,
-                    embedding_function=self.st_embedding_function,
-                    metadata={"hnsw:space": "cosine"}
-                )
+                # Reuse a persisted Chroma collection for this exact corpus if one exists
+                chroma_client = chromadb.PersistentClient(path=os.path.join(self.data_dir, "chroma"))
+                corpus_hash = hashlib.sha256("\0".join(all_chunks).encode()).hexdigest()[:12]
+                collection_name = f"st_{self.text_retriever}_{corpus_hash}"
+                try:
+                    collection = chroma_client.get_collection(
+                        collection_name,
+                        embedding_function=self.st_embedding_function
+                    )
+                    if self.force_reindex or collection.count() != len(all_chunks):
+                        # Rebuild on request, or if left incomplete by an interrupted run
+                        chroma_client.delete_collection(collection_name)
+                        collection = None
+                except Exception:
+                    collection = None
                 
-                # Add documents to collection
-                collection.add(
-                    documents=all_chunks,
-                    ids=[f"chunk_{i}" for i in range(len(all_chunks))]
-                )
+                if collection is None:
+                    # Drop collections built for earlier versions of the corpus with this retriever
+                    for stale in chroma_client.list_collections():
+                        stale_name = getattr(stale, "name", stale)
+                        if stale_name.startswith(f"st_{self.text_retriever}_") and stale_name != collection_name:
+                            chroma_client.delete_collection(stale_name)
+                    
+                    # Create Chroma collection with sentence transformer embeddings
+                    collection = chroma_client.create_collection(
+                        collection_name,
+                        embedding_function=self.st_embedding_function,
+                        metadata={"hnsw:space": "cosine"}
+                    )
+                    
+                    # Add documents to collection
+                    collection.add(
+                        documents=all_chunks,
+                        ids=[f"chunk_{i}" for i in range(len(all_chunks))]
+                    )
+                else:
+                    logger.info(f"Reusing persisted collection {collection_name}")
                 
-                # Process each query
+                # Only non-empty string questions can be embedded; skip the rest
+                all_q_ids = []
+                all_questions = []
+                for q_id, question in zip(self.df['q_id'].tolist(), self.df['question'].tolist()):
+                    if isinstance(question, str) and question.strip():
+                        all_q_ids.append(q_id)
+                        all_questions.append(question)
+                    else:
+                        logger.warning(f"Skipping query {q_id} with missing question")
+                
+                # Get nearest chunks for all queries in one batched call
+                logger.info(f"Processing {len(all_questions)} queries for {self.text_retriever.upper()}")
                 results = []
-                for _, row in tqdm(self.df.iterrows(), desc=f"Processing queries for {self.text_retriever.upper()}"):
-                    q_id = row['q_id']
-                    question = row['question']
-                    
-                    # Get nearest chunks
-                    try:
+                query_results = {'ids': [], 'distances': []}
+                try:
+                    if all_questions:
                         query_results = collection.query(
-                            query_texts=[question],
+                            query_texts=all_questions,
                             n_results=self.top_k*2
                         )
-                        
-                        for rank, (chunk_idx, score) in enumerate(zip(
-                            [int(id.split('_')[1]) for id in query_results['ids'][0]],
-                            query_results['distances'][0]
-                        )):
-                            chunk_info = chunk_to_doc_mapping[chunk_idx]
-                            results.append({
-                                'q_id': q_id,
-                                'question': question,
-                                'chunk': all_chunks[chunk_idx],
-                                'chunk_pdf_name': chunk_info['chunk_pdf_name'],
-                                'pdf_page_number': chunk_info['pdf_page_number'],
-                                'rank': rank + 1,
-                                'score': 1.0 - score  # Convert distance to similarity
-                            })
-                    except Exception as e:
-                        logger.error(f"Error processing query {q_id} with {self.text_retriever}: {str(e)}")
-                        traceback.print_exc()
+                except Exception as e:
+                    # Do not save an empty index that later runs would reuse
+                    logger.error(f"Error processing queries with {self.text_retriever}: {str(e)}")
+                    traceback.print_exc()
+                    return False
+                
+                for q_id, question, ids, distances in zip(
+                    all_q_ids, all_questions, query_results['ids'], query_results['distances']
+                ):
+                    for rank, (chunk_id, score) in enumerate(zip(ids, distances)):
+                        chunk_idx = int(chunk_id.split('_')[1])
+                        chunk_info = chunk_to_doc_mapping[chunk_idx]
+                        results.append({
+                            'q_id': q_id,
+                            'question': question,
+                            'chunk': all_chunks[chunk_idx],
+                            'chunk_pdf_name': chunk_info['chunk_pdf_name'],
+                            'pdf_page_number': chunk_info['pdf_page_number'],
+                            'rank': rank + 1,
+                            'score': 1.0 - score  # Convert distance to similarity
+                        })
             
             # Save results to CSV
-            with open(self.text_retrieval_file, 'w', newline='') as csvfile:
-                fieldnames = ['q_id', 'question', 'chunk', 'chunk_pdf_name', 'pdf_page_number', 'rank', 'score']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(results)
+            fieldnames = ['q_id', 'question', 'chunk', 'chunk_pdf_name', 'pdf_page_number', 'rank', 'score']
+            pd.DataFrame(results, columns=fieldnames).to_csv(self.text_retrieval_file, index=False)
             
             logger.info(f"Text index saved to {self.text_retrieval_file}")
+            self._text_index_built = True
             return True
             
         except Exception as e:
@@ -649,6 +1369,129 @@ class VisDoMRAG:
             traceback.print_exc()
             return False
 
+    def _render_page(self, pdf_path, doc_id, page_idx):
+        """
+        Render a single PDF page into the page image cache, reusing it if already rendered.
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            doc_id (str): Document ID naming the cache directory
+            page_idx (int): Zero-based page number
+            
+        Returns:
+            str: Path to the page image, or None if the page does not exist
+        """
+        return render_pdf_page(pdf_path, os.path.join(self.page_image_dir, doc_id), page_idx, self.page_dpi)
+
+    def _load_page_image(self, pdf_path, doc_id, page_idx):
+        """
+        Load a PDF page as an RGB image, keeping recently used pages in memory.
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            doc_id (str): Document ID naming the cache directory
+            page_idx (int): Zero-based page number
+            
+        Returns:
+            PIL.Image.Image: The page image, or None if the page does not exist
+        """
+        key = (doc_id, page_idx)
+        if key in self._page_images:
+            self._page_images.move_to_end(key)
+            return self._page_images[key]
+        
+        image_path = self._render_page(pdf_path, doc_id, page_idx)
+        if image_path is None:
+            return None
+        
+        with Image.open(image_path) as img:
+            image = img.convert("RGB")
+        
+        if self.page_image_cache_size > 0:
+            self._page_images[key] = image
+            if len(self._page_images) > self.page_image_cache_size:
+                self._page_images.popitem(last=False)
+        return image
+
+    def _load_visual_retrieval(self):
+        """
+        Load the visual retrieval results, grouped by query ID.
+        
+        Returns:
+            dict: Mapping of query IDs to their rows, sorted by descending score
+        """
+        df_retrieval = pd.read_csv(self.vision_retrieval_file)
+        df_retrieval = df_retrieval.sort_values(['q_id', 'score'], ascending=[True, False], kind='stable')
+        return {q_id: rows for q_id, rows in df_retrieval.groupby('q_id', sort=False)}
+
+    def _ensure_visual_retrieval(self):
+        """
+        Build the visual index if needed and load its results, grouped by query.
+        
+        Returns:
+            bool: Whether retrieval results are available
+        """
+        # Check if we need to build the index
+        if not self._visual_index_built and (not os.path.exists(self.vision_retrieval_file) or self.force_reindex):
+            logger.info(f"Visual index not found or force reindex is enabled. Building index...")
+            if not self.build_visual_index():
+                return False
+            self._visual_by_qid = None
+        
+        # Load the retrieval results once, grouped by query
+        if self._visual_by_qid is None:
+            self._visual_by_qid = self._load_visual_retrieval()
+        return True
+
+    def prerender_visual_contexts(self):
+        """
+        Render every page retrieved for any query into the page image cache, in parallel.
+        
+        Pages already in the cache are skipped, so queries later only load images from disk.
+        
+        Returns:
+            int: Number of pages rendered
+        """
+        try:
+            if not self._ensure_visual_retrieval():
+                return 0
+            
+            # Collect the distinct top-k pages of all queries that are not rendered yet
+            pdf_dir = os.path.join(self.data_dir, "docs")
+            pending = set()
+            for query_rows in self._visual_by_qid.values():
+                for document_id in query_rows['document_id'].head(self.top_k):
+                    base_doc_id, page_number = document_id.rsplit('_', 1)
+                    page_number = int(page_number)
+                    image_path = os.path.join(self.page_image_dir, base_doc_id, f"{page_number}.png")
+                    pdf_path = os.path.join(pdf_dir, f"{base_doc_id}.pdf")
+                    if not os.path.exists(image_path) and os.path.exists(pdf_path):
+                        pending.add((pdf_path, base_doc_id, page_number))
+            
+            if not pending:
+                return 0
+            
+            logger.info(f"Pre-rendering {len(pending)} retrieved pages")
+            rendered = 0
+            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                futures = {
+                    executor.submit(render_pdf_page, pdf_path, os.path.join(self.page_image_dir, base_doc_id), page_number, self.page_dpi): (base_doc_id, page_number)
+                    for pdf_path, base_doc_id, page_number in sorted(pending)
+                }
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Rendering pages"):
+                    try:
+                        if future.result() is not None:
+                            rendered += 1
+                    except Exception as e:
+                        base_doc_id, page_number = futures[future]
+                        logger.warning(f"Could not render page {page_number} of {base_doc_id}: {str(e)}")
+            return rendered
+        
+        except Exception as e:
+            logger.error(f"Error pre-rendering visual contexts: {str(e)}")
+            traceback.print_exc()
+            return 0
+
     def retrieve_visual_contexts(self, query_id):
         """
         Retrieve visual contexts using the specified visual retriever.
@@ -660,31 +1503,25 @@ class VisDoMRAG:
             list: Top-k visual contexts (images)
         """
         try:
-            # Check if we need to build the index
-            if not os.path.exists(self.vision_retrieval_file) or self.force_reindex:
-                logger.info(f"Visual index not found or force reindex is enabled. Building index...")
-                if not self.build_visual_index():
-                    return []
-            
-            # Load the retrieval results
-            df_retrieval = pd.read_csv(self.vision_retrieval_file)
-            
-            # Filter for the current query
-            query_rows = df_retrieval[df_retrieval['q_id'] == query_id]
-            if len(query_rows) == 0:
+            if not self._ensure_visual_retrieval():
+                return []
+            
+            # Look up the current query
+            query_rows = self._visual_by_qid.get(query_id)
+            if query_rows is None or len(query_rows) == 0:
                 logger.warning(f"No visual contexts found for query {query_id}")
                 return []
             
-            # Get top-k visual contexts
-            top_k_rows = query_rows.nlargest(self.top_k, 'score')
+            # Get top-k visual contexts (rows are already sorted by descending score)
+            top_k_rows = query_rows.head(self.top_k)
             
             # Load the images from PDFs
             pages = []
             pdf_dir = os.path.join(self.data_dir, "docs")
             
-            for _, row in top_k_rows.iterrows():
+            for row in top_k_rows.itertuples(index=False):
                 try:
-                    document_id = row['document_id']
+                    document_id = row.document_id
                     # Extract base document ID and page number
                     base_doc_id, page_number = document_id.rsplit('_', 1)
                     page_number = int(page_number)
@@ -695,20 +1532,19 @@ class VisDoMRAG:
                         logger.warning(f"PDF file not found: {pdf_path}")
                         continue
                     
-                    # Convert PDF page to image
-                    pdf_images = convert_from_path(pdf_path)
-                    if page_number >= len(pdf_images):
+                    # Render only the needed page, or reuse it from the caches
+                    image = self._load_page_image(pdf_path, base_doc_id, page_number)
+                    if image is None:
                         logger.warning(f"Page {page_number} out of range for {pdf_path}")
                         continue
                     
-                    image = pdf_images[page_number]
                     pages.append({
                         'image': image,
                         'document_id': document_id,
                         'page_number': page_number
                     })
                 except Exception as e:
-                    logger.error(f"Error loading PDF page for {row['document_id']}: {str(e)}")
+                    logger.error(f"Error loading PDF page for {row.document_id}: {str(e)}")
                     traceback.print_exc()
             
             logger.info(f"Retrieved {len(pages)} visual contexts for query {query_id}")
@@ -719,6 +1555,92 @@ class VisDoMRAG:
             traceback.print_exc()
             return []
             
+    def _load_text_retrieval(self):
+        """
+        Load the textual retrieval results, grouped by query ID.
+        
+        Only the columns needed to build contexts are read, and only the top-k
+        rows of each query are materialised. Uses pyarrow when available.
+        
+        Returns:
+            dict: Mapping of query IDs to their top-k rows (as dicts), sorted by rank
+        """
+        if pacsv is None:
+            df_retrieval = pd.read_csv(self.text_retrieval_file, usecols=lambda c: c in TEXT_RETRIEVAL_COLUMNS)
+            df_retrieval = df_retrieval.sort_values(['q_id', 'rank'], kind='stable')
+            return {q_id: rows.head(self.top_k).to_dict('records')
+                    for q_id, rows in df_retrieval.groupby('q_id', sort=False)}
+        
+        # Chunks are raw page text, so quoted values routinely span several lines
+        parse_options = pacsv.ParseOptions(newlines_in_values=True)
+        
+        # Project onto the columns present in this file (older files use document_id/page_number)
+        reader = pacsv.open_csv(self.text_retrieval_file, parse_options=parse_options)
+        try:
+            header = reader.schema.names
+        finally:
+            reader.close()
+        column_types = {'chunk': pa.string()}
+        if not pd.api.types.is_numeric_dtype(self.df['q_id']):
+            # Keep IDs as strings so they match the keys in the query dataframe
+            column_types['q_id'] = pa.string()
+        table = pacsv.read_csv(
+            self.text_retrieval_file,
+            parse_options=parse_options,
+            convert_options=pacsv.ConvertOptions(
+                include_columns=[c for c in TEXT_RETRIEVAL_COLUMNS if c in header],
+                column_types=column_types
+            )
+        )
+        table = table.sort_by([('q_id', 'ascending'), ('rank', 'ascending')])
+        
+        # Rows are now contiguous per query; value_counts follows first-appearance order
+        grouped = {}
+        offset = 0
+        for entry in pc.value_counts(table.column('q_id')).to_pylist():
+            count = entry['counts']
+            grouped[entry['values']] = table.slice(offset, min(count, self.top_k)).to_pylist()
+            offset += count
+        return grouped
+
+    def _ensure_text_retrieval(self):
+        """
+        Build the textual index if needed and load its results, grouped by query.
+        
+        Returns:
+            bool: Whether retrieval results are available
+        """
+        if not self._text_index_built and (not os.path.exists(self.text_retrieval_file) or self.force_reindex):
+            logger.info(f"Textual index not found or force reindex is enabled. Building index...")
+            if not self.build_text_index():
+                return False
+            self._text_by_qid = None
+        
+        if not os.path.exists(self.text_retrieval_file):
+            logger.error(f"Textual index file missing after build: {self.text_retrieval_file}")
+            return False
+
+        # Load the retrieval results once, grouped by query
+        if self._text_by_qid is None:
+            self._text_by_qid = self._load_text_retrieval()
+        return True
+
+    def _prepare_retrieval(self):
+        """
+        Build and load both retrieval indexes outside the event loop.
+        
+        Index building is CPU/GPU heavy and forks worker processes, so it must not run
+        inside the coroutines that are awaiting API responses.
+        """
+        try:
+            # Concurrent callers wait for a single build, then find the results loaded
+            with self._prepare_lock:
+                self._ensure_visual_retrieval()
+                self._ensure_text_retrieval()
+        except Exception as e:
+            logger.error(f"Error preparing retrieval indexes: {str(e)}")
+            traceback.print_exc()
+
     def retrieve_textual_contexts(self, query_id):
         """
         Retrieve textual contexts using the specified text retriever.
@@ -733,29 +1655,18 @@ class VisDoMRAG:
 
         
         try:            
-            if not os.path.exists(self.text_retrieval_file) or self.force_reindex:
-                logger.info(f"Textual index not found or force reindex is enabled. Building index...")
-                if not self.build_text_index():
-                    return []
-
-            self.build_text_index()
-
-            retrieval_path = self.text_retrieval_file
-
-            df_retrieval = pd.read_csv(retrieval_path)
+            if not self._ensure_text_retrieval():
+                return []
             
-            # Filter for the current query
-            query_rows = df_retrieval[df_retrieval['q_id'] == query_id]
-            if len(query_rows) == 0:
+            # Look up the current query
+            query_rows = self._text_by_qid.get(query_id)
+            if not query_rows:
                 logger.warning(f"No textual contexts found for query {query_id}")
                 return []
             
-            # Get top-k textual contexts
-            top_k_rows = query_rows.sort_values(by='rank', ascending=True).head(self.top_k)
-            
-            # Extract the contexts
+            # Extract the contexts (rows are already the top-k, sorted by rank)
             contexts = []
-            for _, row in top_k_rows.iterrows():
+            for row in query_rows:
                 contexts.append({
                     'chunk': row['chunk'],
                     'chunk_pdf_name': row['chunk_pdf_name'] if 'chunk_pdf_name' in row else row.get('document_id', 'unknown'),
@@ -770,104 +1681,281 @@ class VisDoMRAG:
             traceback.print_exc()
             return []
 
-    def encode_image(self, pil_image):
-        """Encode a PIL image to base64 string."""
+    def encode_image(self, pil_image, cache_key=None):
+        """
+        Encode a PIL image to base64 string.
+        
+        Args:
+            pil_image (PIL.Image.Image): Image to encode
+            cache_key (hashable): Optional key, e.g. (document_id, page_number), to reuse earlier encodings
+            
+        Returns:
+            str: Base64-encoded JPEG
+        """
+        if cache_key is not None and cache_key in self._encoded_images:
+            self._encoded_images.move_to_end(cache_key)
+            return self._encoded_images[cache_key]
+        
         buffered = BytesIO()
         pil_image.save(buffered, format="JPEG")
-        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")    
+        if pybase64 is not None:
+            img_str = pybase64.b64encode_as_string(buffered.getvalue())
+        else:
+            img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+        
+        if cache_key is not None and self.encoded_image_cache_size > 0:
+            self._encoded_images[cache_key] = img_str
+            if len(self._encoded_images) > self.encoded_image_cache_size:
+                self._encoded_images.popitem(last=False)
         return img_str
 
-    def generate_visual_response(self, query, visual_contexts):
-
+    def _generate_qwen_batch(self, prompts, max_new_tokens):
         """
-        Generate a response based on visual contexts.
+        Run several prompts through the local Qwen2-VL model in one generate call.
         
         Args:
-            query (str): The user's question
-            visual_contexts (list): List of visual contexts (images)
+            prompts (list): List of (prompt, images) tuples
+            max_new_tokens (int): Generation length limit
             
         Returns:
-            dict: Generated response
+            list: Generated text for each prompt, in order
         """
-        try:
-            # Extract just the images
-            images = [ctx['image'] for ctx in visual_contexts]
-            
-            # Create prompt
-            prompt_template = f"""
-            You are tasked with answering a question based on the relevant pages of a PDF document. Provide your response in the following format:
-            ## Evidence:
+        messages_batch = [
+            [{"role": "user", "content": [{"type": "text", "text": prompt}] + [{"type": "image", "image": img} for img in images]}]
+            for prompt, images in prompts
+        ]
+        
+        texts = [
+            self.qwen_processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            for messages in messages_batch
+        ]
+        if any(images for _, images in prompts):
+            image_inputs, _ = self.process_vision_info(messages_batch)
+            inputs = self.qwen_processor(text=texts, images=image_inputs, padding=True, return_tensors="pt")
+        else:
+            inputs = self.qwen_processor(text=texts, padding=True, return_tensors="pt")
+        
+        # Pinned host memory lets the copies to the GPU run asynchronously
+        inputs = {key: value.pin_memory().to("cuda", non_blocking=True) for key, value in inputs.items()}
 
-            ## Chain of Thought:
+        with torch.inference_mode():
+            generated_ids = self.qwen_model.generate(**inputs, max_new_tokens=max_new_tokens)
+        generated_ids_trimmed = [out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs["input_ids"], generated_ids)]
+        return self.qwen_processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)
 
-            ## Answer:
+    async def _generate_qwen_async(self, prompt, images, max_new_tokens):
+        """
+        Queue a prompt for the local Qwen2-VL model, batching it with requests issued concurrently.
+        
+        Args:
+            prompt (str): Text prompt
+            images (list): PIL images to include after the prompt
+            max_new_tokens (int): Generation length limit
+            
+        Returns:
+            str: Generated text
+        """
+        if self._qwen_lock is None:
+            self._qwen_lock = asyncio.Lock()
+        
+        future = asyncio.get_running_loop().create_future()
+        self._qwen_pending.append((prompt, images, max_new_tokens, future))
+        
+        # Yield once so requests gathered alongside this one can join the batch
+        await asyncio.sleep(0)
+        
+        async with self._qwen_lock:
+            if not future.done():
+                matching = [request for request in self._qwen_pending if request[2] == max_new_tokens]
+                batch = matching[:self.qwen_batch_size]
+                batched = {id(request[3]) for request in batch}
+                self._qwen_pending = [request for request in self._qwen_pending if id(request[3]) not in batched]
+                try:
+                    # Generation runs in a worker thread so the event loop stays responsive
+                    outputs = await asyncio.to_thread(
+                        self._generate_qwen_batch, [(p, imgs) for p, imgs, _, _ in batch], max_new_tokens
+                    )
+                    for (_, _, _, pending_future), output in zip(batch, outputs):
+                        pending_future.set_result(output)
+                except Exception as e:
+                    for _, _, _, pending_future in batch:
+                        pending_future.set_exception(e)
+        
+        return await future
 
-            ___
-            Instructions:
+    def _llm_cache_key(self, prompt, images, *params):
+        """
+        Build a cache key from the model, generation parameters, prompt and image content.
+        
+        Args:
+            prompt (str): Text prompt
+            images (list): PIL images sent with the prompt
+            *params: Generation parameters that affect the output
+            
+        Returns:
+            str: SHA-256 hex digest
+        """
+        hasher = hashlib.sha256(f"{self.llm_model}\n{params}\n{prompt}".encode())
+        for img in images:
+            hasher.update(img.tobytes())
+        return hasher.hexdigest()
 
-            1. Evidence Curation: Extract relevant elements (such as paragraphs, tables, figures, charts) from the provided pages and populate them in the "Evidence" section. For each element, include the type, content, and a brief explanation of its relevance.
+    async def _upload_image_gemini(self, pil_image, cache_key):
+        """
+        Upload a page image to the Gemini File API once and reuse the file reference.
+        
+        Args:
+            pil_image (PIL.Image.Image): Image to upload
+            cache_key (hashable): Stable key, e.g. (document_id, page_number), identifying the image
+            
+        Returns:
+            File: Uploaded file reference usable in a multimodal prompt
+        """
+        upload = self._uploaded_images.get(cache_key)
+        if upload is None:
+            upload = asyncio.ensure_future(asyncio.to_thread(self._upload_image_gemini_sync, pil_image))
+            self._uploaded_images[cache_key] = upload
+        try:
+            return await upload
+        except Exception:
+            # Let a later request retry the upload
+            if self._uploaded_images.get(cache_key) is upload:
+                del self._uploaded_images[cache_key]
+            raise
 
-            2. Chain of Thought: In the "Chain of Thought" section, list out each logical step you take to derive the answer, referencing the evidence where applicable. You should perform computations if you need to to get to the answer. 
+    def _upload_image_gemini_sync(self, pil_image):
+        """
+        Upload a PIL image to the Gemini File API as a JPEG.
+        
+        Args:
+            pil_image (PIL.Image.Image): Image to upload
+            
+        Returns:
+            File: Uploaded file reference
+        """
+        buffered = BytesIO()
+        pil_image.save(buffered, format="JPEG")
+        buffered.seek(0)
+        return genai.upload_file(buffered, mime_type="image/jpeg")
 
-            3. Answer: {self.qa_prompt}
-            ___
-            Question: {query}
-            """
+    async def _generate_async(self, prompt, images=None, image_keys=None, max_tokens=3000, temperature=0.7, max_new_tokens=512):
+        """
+        Send a prompt, optionally with images, to the configured LLM without blocking the event loop.
+        
+        Responses are served from the persistent cache when enable_cache is set.
+        
+        Args:
+            prompt (str): Text prompt
+            images (list): Optional PIL images to include with the prompt
+            image_keys (list): Optional stable keys identifying each image, used to reuse encodings
+            max_tokens (int): Completion limit for GPT-4
+            temperature (float): Sampling temperature for GPT-4
+            max_new_tokens (int): Generation length limit for Qwen
             
-            if self.llm_model == "gpt4":
-                base64_images = [self.encode_image(img) for img in images]
-                
-                messages = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            } for base64_image in base64_images
-                        ] + [
-                            {"type": "text", "text": prompt_template}
-                        ]
-                    }
-                ]
+        Returns:
+            str: Generated text
+        """
+        images = images or []
+        image_keys = image_keys or [None] * len(images)
+        
+        cache_key = None
+        if self._cache is not None:
+            cache_key = self._llm_cache_key(prompt, images, max_tokens, temperature, max_new_tokens)
+            if cache_key in self._cache:
+                return self._cache[cache_key]
+        
+        if self._limiter is not None:
+            # Waits only when the per-minute request budget is exhausted
+            async with self._limiter:
+                response = await self._call_llm_async(prompt, images, image_keys, max_tokens, temperature, max_new_tokens)
+        else:
+            response = await self._call_llm_async(prompt, images, image_keys, max_tokens, temperature, max_new_tokens)
+        
+        if cache_key is not None:
+            self._cache[cache_key] = response
+        return response
 
-                response = self.client.chat.completions.create(
-                    model="chatgpt-4o-latest",
-                    messages=messages,
-                    max_tokens=3000,
-                    temperature=0.7
-                )
-                
-                return response.choices[0].message.content
-                
-            elif self.llm_model == "gemini":
-                multimodal_prompt = [prompt_template] + images
-                response = self.llm.generate_content(multimodal_prompt)
-                return response.text
-                
-            elif self.llm_model == "qwen":
-                messages = [
-                    {"role": "user", "content": [{"type": "image", "image": img} for img in images] + [{"type": "text", "text": prompt_template}]}
+    async def _call_llm_async(self, prompt, images, image_keys, max_tokens, temperature, max_new_tokens):
+        """
+        Issue a single request to the configured LLM.
+        
+        Args:
+            prompt (str): Text prompt
+            images (list): PIL images to include with the prompt
+            image_keys (list): Stable key (or None) for each image
+            max_tokens (int): Completion limit for GPT-4
+            temperature (float): Sampling temperature for GPT-4
+            max_new_tokens (int): Generation length limit for Qwen
+            
+        Returns:
+            str: Generated text
+        """
+        if self.llm_model == "gpt4":
+            if images:
+                # Text first so the static prompt prefix leads the request
+                content = [
+                    {"type": "text", "text": prompt}
+                ] + [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{self.encode_image(img, key)}"
+                        }
+                    } for img, key in zip(images, image_keys)
                 ]
-                
-                text = self.qwen_processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-                image_inputs, _ = self.process_vision_info(messages)
-                inputs = self.qwen_processor(text=[text], images=image_inputs, padding=True, return_tensors="pt").to("cuda")
+            else:
+                content = prompt
+            
+            response = await self.aclient.chat.completions.create(
+                model="chatgpt-4o-latest",
+                messages=[
+                    {"role": "user", "content": content}
+                ],
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            return response.choices[0].message.content
+        
+        elif self.llm_model == "gemini":
+            if images and self.upload_images:
+                # Reference pages uploaded once via the File API instead of inlining them
+                images = await asyncio.gather(*[
+                    self._upload_image_gemini(img, key) if key is not None else asyncio.sleep(0, img)
+                    for img, key in zip(images, image_keys)
+                ])
+            response = await self.llm.generate_content_async([prompt] + images if images else prompt)
+            return response.text
+        
+        elif self.llm_model == "qwen":
+            return await self._generate_qwen_async(prompt, images, max_new_tokens)
 
-                generated_ids = self.qwen_model.generate(**inputs, max_new_tokens=512)
-                generated_ids_trimmed = [out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)]
-                output_text = self.qwen_processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)
-                
-                return output_text[0]
+    async def generate_visual_response(self, query, visual_contexts):
+        """
+        Generate a response based on visual contexts.
+        
+        Args:
+            query (str): The user's question
+            visual_contexts (list): List of visual contexts (images)
+            
+        Returns:
+            str: Generated response, or None if generation failed
+        """
+        try:
+            # Extract just the images
+            images = [ctx['image'] for ctx in visual_contexts]
+            
+            # Create prompt: static instructions first, then the question
+            prompt_template = "".join((self._visual_prompt_prefix, "Question: ", str(query), "\n"))
+            
+            image_keys = [(ctx['document_id'], ctx['page_number']) for ctx in visual_contexts]
+            return await self._generate_async(prompt_template, images=images, image_keys=image_keys)
         
         except Exception as e:
             logger.error(f"Error generating visual response: {str(e)}")
             traceback.print_exc()
-            return "Error generating response from visual contexts."
+            return None
     
-    def generate_textual_response(self, query, textual_contexts):
+    async def generate_textual_response(self, query, textual_contexts):
         """
         Generate a response based on textual contexts.
         
@@ -876,69 +1964,21 @@ class VisDoMRAG:
             textual_contexts (list): List of textual contexts
             
         Returns:
-            dict: Generated response
+            str: Generated response, or None if generation failed
         """
         try:
-            # Extract the text chunks
-            contexts = [ctx['chunk'] for ctx in textual_contexts]
-            contexts_str = "\n- ".join(contexts)
-            
-            # Create prompt
-            prompt_template = f"""
-            You are tasked with answering a question based on the relevant chunks of a PDF document. Provide your response in the following format:
-            ## Evidence:
-
-            ## Chain of Thought:
-
-            ## Answer:
-
-            ___
-            Instructions:
-
-            1. Evidence Curation: Extract relevant elements (such as paragraphs, tables, figures, charts) from the provided chunks and populate them in the "Evidence" section. For each element, include the type, content, and a brief explanation of its relevance.
-
-            2. Chain of Thought: In the "Chain of Thought" section, list out each logical step you take to derive the answer, referencing the evidence where applicable. You should perform computations if you need to to get to the answer. 
-
-            3. Answer: {self.qa_prompt}
-            ___
-            Question: {query}
-            ___
-            Context: {contexts_str}
+            # Create prompt in a single join: static instructions first, then the question and context
+            prompt_template = "".join((
+                self._textual_prompt_prefix,
+                "Question: ", str(query),
+                "\n___\nContext: ", "\n- ".join(ctx['chunk'] for ctx in textual_contexts), "\n"
+            ))
             
-            """
-            
-            if self.llm_model == "gpt4":
-                response = self.client.chat.completions.create(
-                    model="chatgpt-4o-latest",
-                    messages=[
-                        {"role": "user", "content": prompt_template}
-                    ],
-                    max_tokens=3000,
-                    temperature=0.7
-                )
-                return response.choices[0].message.content
-                
-            elif self.llm_model == "gemini":
-                response = self.llm.generate_content(prompt_template)
-                return response.text
-                
-            elif self.llm_model == "qwen":
-                messages = [
-                    {"role": "user", "content": [{"type": "text", "text": prompt_template}]}
-                ]
-                
-                text = self.qwen_processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-                inputs = self.qwen_processor(text=[text], padding=True, return_tensors="pt").to("cuda")
-
-                generated_ids = self.qwen_model.generate(**inputs, max_new_tokens=512)
-                generated_ids_trimmed = [out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)]
-                output_text = self.qwen_processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)
-                
-                return output_text[0]
+            return await self._generate_async(prompt_template)
         
         except Exception as e:
             logger.error(f"Error generating textual response: {str(e)}")
-            return "Error generating response from textual contexts."
+            return None
 
     def extract_sections(self, text):
         """
@@ -950,27 +1990,21 @@ class VisDoMRAG:
         Returns:
             dict: Extracted sections
         """
-        sections = {}
-        headings = ["Evidence", "Chain of Thought", "Answer"]
+        sections = {"Evidence": "", "Chain of Thought": "", "Answer": ""}
         
-        for i in range(len(headings)):
-            heading = headings[i]
-            next_heading = headings[i + 1] if i + 1 < len(headings) else None
-            
-            if next_heading:
-                pattern = rf"## {heading}:(.*?)(?=## {next_heading}:)"
-            else:
-                pattern = rf"## {heading}:(.*)"
-            
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                sections[heading] = match.group(1).strip()
-            else:
-                sections[heading] = ""
+        # Single scan over the headings; each body runs up to the next heading
+        matches = list(SECTION_HEADING_RE.finditer(text))
+        seen = set()
+        for match, next_match in zip(matches, matches[1:] + [None]):
+            heading = match['heading']
+            if heading not in seen:
+                end = next_match.start() if next_match else len(text)
+                sections[heading] = text[match.end():end].strip()
+                seen.add(heading)
         
         return sections
 
-    def combine_responses(self, query, visual_response, textual_response, answer):
+    async def combine_responses(self, query, visual_response, textual_response, answer):
         """
         Combine visual and textual responses to generate a final answer.
         
@@ -981,75 +2015,29 @@ class VisDoMRAG:
             answer (str): Ground truth answer if available
             
         Returns:
-            dict: Combined response
+            dict: Combined response, or None if generation failed
         """
         try:
-            prompt = f"""
-            Analyze the following two responses to the question: "{query}"
-
-            Response 1:
-            Evidence: {visual_response.get('Evidence', "Evidence not available")}
-            Chain of Thought: {visual_response.get('Chain of Thought', "CoT not available")}
-            Final Answer: {visual_response['Answer']}
-
-            Response 2:
-            Evidence: {textual_response.get('Evidence', "Evidence not available")}
-            Chain of Thought: {textual_response.get('Chain of Thought', "CoT not available")}
-            Final Answer: {textual_response['Answer']}
-
-            Response 1 is based on a visual q/a pipeline, and Response 2 is based on a textual q/a pipeline. 
-            - In general, given both response 1 and response 2 have logical chains of thoughts, and decision boils down to evidence, you should place higher degree of trust on evidence reported in Response 1.
-            - If one of the responses has declined giving a clear answer, please weigh the other answer more unless there is reasonable thought to not answer, and both thoughts are inconsistent.
-            - Language of the answer should be short and direct, usually answerable in a single sentence, or phrase. You should directly give the specific response to an answer.
-
-            Consider both chains of thought and final answers. Provide your analysis in the following format:
-
-            ## Analysis:
-            [Your detailed analysis here, evaluating the consistency of both the chains of thoughts, with respect to each other, the question and their respective answers, as well as validity of the evidence.]
-
-            ## Conclusion:
-            [Your conclusion on which answer is more likely to be correct, or if a synthesis of both is needed]
-
-            ## Final Answer:
-            [Answer the question "{query}", based on your analysis of the two candidates so far. Please ensure that answers are short and concise, similar in language to the provided answers.]
-            """
-            
-            if self.llm_model == "gpt4":
-                response = self.client.chat.completions.create(
-                    model="chatgpt-4o-latest",
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=1500,
-                    temperature=0.3
-                )
-                return self.parse_combined_output(response.choices[0].message.content)
-                
-            elif self.llm_model == "gemini":
-                response = self.llm.generate_content(prompt)
-                return self.parse_combined_output(response.text)
-                
-            elif self.llm_model == "qwen":
-                messages = [
-                    {"role": "user", "content": [{"type": "text", "text": prompt}]}
-                ]
-                
-                text = self.qwen_processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-                inputs = self.qwen_processor(text=[text], padding=True, return_tensors="pt").to("cuda")
+            # Static instructions first, then the question and both responses
+            prompt = COMBINE_PROMPT_PREFIX + f"""Question: "{query}"
 
-                generated_ids = self.qwen_model.generate(**inputs, max_new_tokens=1000)
-                generated_ids_trimmed = [out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)]
-                output_text = self.qwen_processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)
-                
-                return self.parse_combined_output(output_text[0])
+Response 1:
+Evidence: {visual_response.get('Evidence', "Evidence not available")}
+Chain of Thought: {visual_response.get('Chain of Thought', "CoT not available")}
+Final Answer: {visual_response['Answer']}
+
+Response 2:
+Evidence: {textual_response.get('Evidence', "Evidence not available")}
+Chain of Thought: {textual_response.get('Chain of Thought', "CoT not available")}
+Final Answer: {textual_response['Answer']}
+"""
+            
+            output = await self._generate_async(prompt, max_tokens=1500, temperature=0.3, max_new_tokens=1000)
+            return self.parse_combined_output(output)
         
         except Exception as e:
             logger.error(f"Error combining responses: {str(e)}")
-            return {
-                "Analysis": "Error occurred during analysis.",
-                "Conclusion": "Error occurred during conclusion.",
-                "Final Answer": "Error occurred during combination of responses."
-            }
+            return None
 
     def parse_combined_output(self, output):
         """
@@ -1062,13 +2050,13 @@ class VisDoMRAG:
             dict: Parsed sections
         """
         sections = {'Analysis': '', 'Conclusion': '', 'Final Answer': ''}
-        current_section = None
 
-        for line in output.split('\n'):
-            if line.startswith('## '):
-                current_section = line[3:].strip(':')
-            elif current_section and current_section in sections:
-                sections[current_section] += line + '\n'
+        # Split on "## Heading" lines: [preamble, heading, body, heading, body, ...]
+        parts = MARKDOWN_HEADING_RE.split(output)
+        for heading, body in zip(parts[1::2], parts[2::2]):
+            heading = heading.strip(':')
+            if heading in sections:
+                sections[heading] += body
 
         # Clean up the sections
         for key in sections:
@@ -1076,10 +2064,182 @@ class VisDoMRAG:
 
         return sections
 
+    def _run_coroutine(self, coro):
+        """
+        Run a coroutine to completion on the pipeline's event loop.
+        
+        When the caller already runs an event loop (e.g. Jupyter/IPython), the pipeline's
+        loop is driven from a worker thread, since a second loop cannot run on that thread.
+        Async callers can await process_query_async directly instead.
+        """
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._loop.run_until_complete(coro)
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(self._loop.run_until_complete, coro).result()
+
     def process_query(self, query_id):
         """
         Process a single query through the complete VisDoMRAG pipeline.
         
+        Args:
+            query_id (str): The query ID
+            
+        Returns:
+            bool: Success status
+        """
+        self._prepare_retrieval()
+        return self._run_coroutine(self.process_query_async(query_id))
+
+    def _load_response(self, kind, query_id):
+        """
+        Load a saved response for a query.
+        
+        Args:
+            kind (str): Response kind: "vision", "text" or "visdmrag"
+            query_id (str): The query ID
+            
+        Returns:
+            dict: The saved response, or None if there is none
+        """
+        if self.output_format == "jsonl":
+            if kind not in self._jsonl_records:
+                self._jsonl_records[kind] = read_jsonl(f"{self.output_dir}/{self.llm_model}_{kind}.jsonl")
+            return self._jsonl_records[kind].get(query_id)
+        
+        response_file = f"{self.output_dir}/{self.llm_model}_{kind}/response_{str(query_id).replace('/','$')}.json"
+        if not os.path.exists(response_file):
+            return None
+        with open(response_file, 'r') as file:
+            return json.load(file)
+
+    def _save_response(self, kind, query_id, response):
+        """
+        Save a response for a query, as a JSON file or an appended JSONL record.
+        
+        Args:
+            kind (str): Response kind: "vision", "text" or "visdmrag"
+            query_id (str): The query ID
+            response (dict): Response to save
+        """
+        if self.output_format != "jsonl":
+            write_json(response, f"{self.output_dir}/{self.llm_model}_{kind}/response_{str(query_id).replace('/','$')}.json")
+            return
+        
+        if kind not in self._jsonl_files:
+            jsonl_path = f"{self.output_dir}/{self.llm_model}_{kind}.jsonl"
+            file = open(jsonl_path, "ab", buffering=1 << 20)
+            # Terminate a record truncated by an interrupted run so new records start on their own line
+            if file.tell() > 0:
+                with open(jsonl_path, "rb") as existing:
+                    existing.seek(-1, os.SEEK_END)
+                    if existing.read(1) != b"\n":
+                        file.write(b"\n")
+            self._jsonl_files[kind] = file
+        file = self._jsonl_files[kind]
+        # Flush each record so an interrupted run keeps every completed query
+        file.write(dump_json_line({"q_id": query_id.item() if hasattr(query_id, "item") else query_id, **response}))
+        file.flush()
+        self._jsonl_records.setdefault(kind, {})[query_id] = response
+
+    def _close_outputs(self):
+        """Close any open JSONL output files."""
+        for file in self._jsonl_files.values():
+            file.close()
+        self._jsonl_files = {}
+
+    async def _get_visual_response(self, query_id, question, answer):
+        """
+        Load the saved visual response for a query, or generate and save it.
+        
+        Args:
+            query_id (str): The query ID
+            question (str): The user's question
+            answer: Ground truth answer
+            
+        Returns:
+            dict: Visual response sections and metadata, or None if no contexts were found or generation failed
+        """
+        # Reuse an existing visual response
+        saved_response = self._load_response("vision", query_id)
+        if saved_response is not None:
+            return saved_response
+        
+        logger.info(f"Generating visual response for query {query_id}")
+        visual_contexts = self.retrieve_visual_contexts(query_id)
+        if not visual_contexts:
+            return None
+        
+        visual_response = await self.generate_visual_response(question, visual_contexts)
+        if visual_response is None:
+            # Not saved, so the query is retried on the next run
+            return None
+        visual_response_dict = self.extract_sections(visual_response)
+        
+        # Add metadata
+        visual_response_dict.update({
+            "question": question,
+            "document": [ctx['document_id'] for ctx in visual_contexts],
+            "gt_answer": answer,
+            "pages": [ctx['page_number'] for ctx in visual_contexts]
+        })
+        
+        # Save visual response
+        self._save_response("vision", query_id, visual_response_dict)
+        
+        return visual_response_dict
+
+    async def _get_textual_response(self, query_id, question, answer):
+        """
+        Load the saved textual response for a query, or generate and save it.
+        
+        Args:
+            query_id (str): The query ID
+            question (str): The user's question
+            answer: Ground truth answer
+            
+        Returns:
+            dict: Textual response sections and metadata, or None if no contexts were found or generation failed
+        """
+        # Reuse an existing textual response
+        saved_response = self._load_response("text", query_id)
+        if saved_response is not None:
+            return saved_response
+        
+        logger.info(f"Generating textual response for query {query_id}")
+        textual_contexts = self.retrieve_textual_contexts(query_id)
+        if not textual_contexts:
+            return None
+        
+        textual_response = await self.generate_textual_response(question, textual_contexts)
+        if textual_response is None:
+            # Not saved, so the query is retried on the next run
+            return None
+        textual_response_dict = self.extract_sections(textual_response)
+        
+        # Add metadata
+        textual_response_dict.update({
+            "question": question,
+            "document": [ctx['chunk_pdf_name'] for ctx in textual_contexts],
+            "gt_answer": answer,
+            "pages": [ctx['pdf_page_number'] for ctx in textual_contexts],
+            "chunks": "\n".join([ctx['chunk'] for ctx in textual_contexts])
+        })
+        
+        # Save textual response
+        self._save_response("text", query_id, textual_response_dict)
+        
+        return textual_response_dict
+
+    async def process_query_async(self, query_id):
+        """
+        Process a single query through the complete VisDoMRAG pipeline, awaiting LLM calls.
+        
         Args:
             query_id (str): The query ID
             
@@ -1087,91 +2247,25 @@ class VisDoMRAG:
             bool: Success status
         """
         try:
+            # Build or load the indexes off the event loop if the caller has not done so
+            if self._visual_by_qid is None or self._text_by_qid is None:
+                await asyncio.to_thread(self._prepare_retrieval)
+            
             # Get query information
-            query_row = self.df[self.df['q_id'] == query_id].iloc[0]
+            query_row = self.df_by_qid.loc[query_id]
             question = query_row['question']
+            answer = query_row['parsed_answer']
             
-            try:
-                # Try to parse the answer field as a list/dict if it's in that format
-                answer = eval(query_row['answer'])
-            except:
-                # If parsing fails, use as-is
-                answer = query_row['answer']
-            
-            # Define file paths for outputs
-            visual_file = f"{self.output_dir}/{self.llm_model}_vision/response_{str(query_id).replace('/','$')}.json"
-            textual_file = f"{self.output_dir}/{self.llm_model}_text/response_{str(query_id).replace('/','$')}.json"
-            combined_file = f"{self.output_dir}/{self.llm_model}_visdmrag/response_{str(query_id).replace('/','$')}.json"
-            
-            # Skip if the combined file already exists
-            if os.path.exists(combined_file):
-                logger.info(f"Combined file already exists for query {query_id}")
+            # Skip if the combined response already exists
+            if self._load_response("visdmrag", query_id) is not None:
+                logger.info(f"Combined response already exists for query {query_id}")
                 return True
             
-            # Process visual contexts if needed
-            visual_response_dict = None
-            if not os.path.exists(visual_file):
-                logger.info(f"Generating visual response for query {query_id}")
-                visual_contexts = self.retrieve_visual_contexts(query_id)
-                
-                if visual_contexts:
-                    visual_response = self.generate_visual_response(question, visual_contexts)
-                    visual_response_dict = self.extract_sections(visual_response)
-                    
-                    # Add metadata
-                    visual_response_dict.update({
-                        "question": question,
-                        "document": [ctx['document_id'] for ctx in visual_contexts],
-                        "gt_answer": answer,
-                        "pages": [ctx['page_number'] for ctx in visual_contexts]
-                    })
-                    
-                    # Save visual response
-                    with open(visual_file, 'w') as file:
-                        json.dump(visual_response_dict, file, indent=4)
-                    
-                    # Memory cleanup
-                    del visual_contexts
-                    gc.collect()
-                    if torch.cuda.is_available():
-                        torch.cuda.empty_cache()
-            else:
-                # Load existing visual response
-                with open(visual_file, 'r') as file:
-                    visual_response_dict = json.load(file)
-            
-            # Process textual contexts if needed
-            textual_response_dict = None
-            if not os.path.exists(textual_file):
-                logger.info(f"Generating textual response for query {query_id}")
-                textual_contexts = self.retrieve_textual_contexts(query_id)
-                
-                if textual_contexts:
-                    textual_response = self.generate_textual_response(question, textual_contexts)
-                    textual_response_dict = self.extract_sections(textual_response)
-                    
-                    # Add metadata
-                    textual_response_dict.update({
-                        "question": question,
-                        "document": [ctx['chunk_pdf_name'] for ctx in textual_contexts],
-                        "gt_answer": answer,
-                        "pages": [ctx['pdf_page_number'] for ctx in textual_contexts],
-                        "chunks": "\n".join([ctx['chunk'] for ctx in textual_contexts])
-                    })
-                    
-                    # Save textual response
-                    with open(textual_file, 'w') as file:
-                        json.dump(textual_response_dict, file, indent=4)
-                    
-                    # Memory cleanup
-                    del textual_contexts
-                    gc.collect()
-                    if torch.cuda.is_available():
-                        torch.cuda.empty_cache()
-            else:
-                # Load existing textual response
-                with open(textual_file, 'r') as file:
-                    textual_response_dict = json.load(file)
+            # Generate the visual and textual responses concurrently
+            visual_response_dict, textual_response_dict = await asyncio.gather(
+                self._get_visual_response(query_id, question, answer),
+                self._get_textual_response(query_id, question, answer)
+            )
             
             # Skip if either response is missing
             if not visual_response_dict or not textual_response_dict:
@@ -1180,12 +2274,15 @@ class VisDoMRAG:
             
             # Combine responses
             logger.info(f"Combining responses for query {query_id}")
-            combined_sections = self.combine_responses(
+            combined_sections = await self.combine_responses(
                 question, 
                 visual_response_dict, 
                 textual_response_dict,
                 answer
             )
+            if combined_sections is None:
+                logger.warning(f"Failed to combine responses for query {query_id}")
+                return False
             
             # Create combined response
             combined_response = {
@@ -1199,13 +2296,7 @@ class VisDoMRAG:
             }
             
             # Save combined response
-            with open(combined_file, 'w') as file:
-                json.dump(combined_response, file, indent=4)
-            
-            # Memory cleanup
-            gc.collect()
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
+            self._save_response("visdmrag", query_id, combined_response)
             
             return True
             
@@ -1213,26 +2304,82 @@ class VisDoMRAG:
             logger.error(f"Error processing query {query_id}: {str(e)}")
             return False
 
-    def run(self):
-        """Run the VisDoMRAG pipeline on all queries in the dataset."""
-        logger.info("Starting VisDoMRAG pipeline")
+    async def _process_query_bounded(self, query_id, semaphore, progress):
+        """
+        Process a query once a concurrency slot is available.
         
-        # Process each query
-        for query_id in tqdm(self.df['q_id'].unique()):
+        Args:
+            query_id (str): The query ID
+            semaphore (asyncio.Semaphore): Limits the number of in-flight queries
+            progress (tqdm): Progress bar to advance when the query finishes
+        """
+        async with semaphore:
             try:
                 logger.info(f"Processing query {query_id}")
-                success = self.process_query(query_id)
+                success = await self.process_query_async(query_id)
                 
                 if success:
                     logger.info(f"Successfully processed query {query_id}")
                 else:
                     logger.warning(f"Failed to process query {query_id}")
                 
-                # Pause to avoid hitting API rate limits
-                time.sleep(1)
-                
             except Exception as e:
                 logger.error(f"Error processing query {query_id}: {str(e)}")
+            finally:
+                progress.update(1)
+                self._release_memory()
+
+    def _release_memory(self):
+        """
+        Reclaim memory only when it is worth the cost.
+        
+        Runs a full garbage collection every gc_interval queries, and empties the CUDA
+        cache only when reserved memory exceeds cuda_memory_threshold of the device total.
+        """
+        self._queries_since_gc += 1
+        if self._queries_since_gc >= self.gc_interval:
+            gc.collect()
+            self._queries_since_gc = 0
+        
+        if torch.cuda.is_available():
+            total_memory = torch.cuda.get_device_properties(0).total_memory
+            if torch.cuda.memory_reserved() > self.cuda_memory_threshold * total_memory:
+                torch.cuda.empty_cache()
+
+    async def _run_async(self):
+        """Process all queries concurrently, bounded by max_concurrency."""
+        # Qwen generate calls are serialised by the micro-batcher, so concurrency only
+        # controls how many queries can share a batch
+        concurrency = self.qwen_batch_size if self.llm_model == "qwen" else self.max_concurrency
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        query_ids = self.df['q_id'].unique()
+        
+        # Automatic collection is replaced by the periodic gc.collect() in _release_memory
+        gc.disable()
+        try:
+            with tqdm(total=len(query_ids)) as progress:
+                tasks = [self._process_query_bounded(query_id, semaphore, progress) for query_id in query_ids]
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            gc.enable()
+
+    def run(self):
+        """Run the VisDoMRAG pipeline on all queries in the dataset."""
+        logger.info("Starting VisDoMRAG pipeline")
+        
+        # Build both indexes before any query coroutine starts
+        self._prepare_retrieval()
+        
+        # Render all retrieved pages up front so queries only read them from disk
+        if self.prerender_pages:
+            self.prerender_visual_contexts()
+        
+        # Process queries concurrently
+        try:
+            self._run_coroutine(self._run_async())
+        finally:
+            self._close_outputs()
         
         logger.info("VisDoMRAG pipeline completed")
 